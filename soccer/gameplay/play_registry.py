@@ -1,5 +1,29 @@
 from PyQt5 import QtCore
 import logging
+import weakref
+
+# Qt constants used by the item model callbacks, bound once at import so the
+# per-cell callbacks don't repeat the QtCore.Qt attribute lookups
+_DISPLAY_ROLE = QtCore.Qt.DisplayRole
+_CHECK_STATE_ROLE = QtCore.Qt.CheckStateRole
+_HORIZONTAL = QtCore.Qt.Horizontal
+# flags for the 'Play' column (checkable) and the 'Score' column
+_PLAY_COLUMN_FLAGS = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsUserCheckable | QtCore.Qt.ItemIsEditable
+_SCORE_COLUMN_FLAGS = QtCore.Qt.ItemIsEnabled
+# returned for items that have no parent in the model; Qt copies returned
+# indexes, so sharing one instance is safe and saves an allocation per call
+_INVALID_INDEX = QtCore.QModelIndex()
+
+
+# sort key giving the position of a Node or Category in the registry's tree: the
+# rows of it and each of its ancestors, starting from the top
+def _tree_position(item):
+    rows = []
+    while item.parent is not None:
+        rows.append(item.row)
+        item = item.parent
+    rows.reverse()
+    return rows
 
 
 ## Holds references to all Play subclasses and their enabled state
@@ -16,6 +40,15 @@ class PlayRegistry(QtCore.QAbstractItemModel):
     def __init__(self):
         super().__init__()
         self._root = PlayRegistry.Category(None, "")
+        # the Nodes that are currently enabled, kept up to date by Node.enabled
+        # so we don't have to walk the whole tree every frame
+        self._enabled_nodes = set()
+        # the enabled Nodes in tree order, or None if they need re-sorting.
+        # Play selection takes the first of any plays with tied scores, so the
+        # order has to match the tree and not the order plays were enabled in.
+        self._enabled_in_tree_order = None
+        # maps each registered play class to its Node for fast membership tests
+        self._by_class = dict()
 
     @property
     def root(self):
@@ -30,15 +63,28 @@ class PlayRegistry(QtCore.QAbstractItemModel):
         # iterate up to the last one (the last one is just an underscored,
         # lowercased version of the play's name and we don't display it in the tree)
         for module in module_path[:-1]:
-            if not category.has_child_with_name(module):
+            subcategory = category[module]
+            if subcategory is None:
                 subcategory = PlayRegistry.Category(category, module)
                 category.append_child(subcategory)
-            category = category[module]
-
-        playNode = PlayRegistry.Node(module_path[-1], play_class)
+            elif subcategory._is_leaf:
+                # children are keyed by module name, so a play module and a
+                # directory can't share a name
+                raise AssertionError(
+                    "Can't register " + '/'.join(module_path) + ": '" +
+                    module + "' is already registered as a play")
+            category = subcategory
+
+        playNode = PlayRegistry.Node(module_path[-1], play_class, self)
         # if playNode.module_name in category:
         #     raise AssertionError("There's already a play registered for the given module path")
-        category.append_child(playNode)
+        # a module can be registered again (e.g. a repeated 'created' event from
+        # the filesystem watcher), in which case the new Node takes its place
+        replaced = category.append_child(playNode)
+        if replaced is not None:
+            self._forget_node(replaced)
+            playNode.enabled = replaced.enabled
+        self._by_class[play_class] = playNode
 
         # note: this is a shitty way to do this - we should really only reload part of the model
         self.modelReset.emit()
@@ -58,20 +104,29 @@ class PlayRegistry(QtCore.QAbstractItemModel):
 
     def delete(self, module_path):
         node = self.node_for_module_path(module_path)
-        del node.parent[node.name]
+        category = node.parent
+        category.remove_child(node.module_name)
+        self._forget_node(node)
 
         # remove any categories where this play was the only entry
-        node = node.parent
-        while node.parent is not None:
-            if len(node.children) == 0:
-                del node.parent[node.name]
-                node = node.parent
-            else:
-                break
+        while category.parent is not None and not category._children:
+            parent = category.parent
+            parent.remove_child(category.module_name)
+            category = parent
 
         # note: this is a shitty way to do this - we should really only reload part of the model
         self.modelReset.emit()
 
+    # drops a Node that has been removed from the tree from the registry's
+    # enabled set and class index, and detaches it from the registry
+    def _forget_node(self, node):
+        if node._enabled:
+            self._enabled_nodes.discard(node)
+            self._enabled_in_tree_order = None
+        if self._by_class.get(node.play_class) is node:
+            del self._by_class[node.play_class]
+        node._registry = None
+
     def clear(self):
         enabled_plays = self.get_enabled_plays_paths()
         for play in enabled_plays:
@@ -86,10 +141,19 @@ class PlayRegistry(QtCore.QAbstractItemModel):
     def recalculate_scores(self):
         self.root.recalculate_scores(self)
 
+    # returns the currently-enabled Nodes in tree order
+    # The sorted list is cached until a play is enabled, disabled, or removed.
+    # Inserting plays doesn't change the relative order of existing ones.
+    def _enabled_nodes_in_tree_order(self):
+        if self._enabled_in_tree_order is None:
+            self._enabled_in_tree_order = sorted(self._enabled_nodes,
+                                                 key=_tree_position)
+        return self._enabled_in_tree_order
+
     ## Get a list of all plays in the tree that are currently enabled
     def get_enabled_plays_and_scores(self):
         return [(node.play_class, node.last_score)
-                for node in self if node.enabled]
+                for node in self._enabled_nodes_in_tree_order()]
 
     ## Returns a list of module paths for the currently-enabled plays
     # The module path is a list or tuple giving the path the the play's python module
@@ -97,51 +161,45 @@ class PlayRegistry(QtCore.QAbstractItemModel):
     def get_enabled_plays_paths(self):
         enabled_plays = []
 
-        for node in self:
-            if node.enabled:
-                play_path = []
+        for node in self._enabled_nodes_in_tree_order():
+            play_path = []
 
-                curr_node = node
-                while curr_node is not None:
-                    if curr_node.module_name:
-                        play_path.insert(0, curr_node.module_name)
-                    curr_node = curr_node.parent
+            curr_node = node
+            while curr_node is not None:
+                if curr_node.module_name:
+                    play_path.insert(0, curr_node.module_name)
+                curr_node = curr_node.parent
 
-                enabled_plays.append(play_path)
+            enabled_plays.append(play_path)
 
         return enabled_plays
 
     # iterates over all of the Nodes registered in the tree
+    # The traversal uses an explicit stack of child iterators rather than
+    # recursive generators, so it stays in tree order without a generator frame
+    # per category.
     def __iter__(self):
-        def _recursive_iter(category):
-            for child in category.children:
-                if isinstance(child, PlayRegistry.Node):
+        stack = [iter(self.root._children)]
+        while stack:
+            for child in stack[-1]:
+                if child._is_leaf:
                     yield child
                 else:
-                    yield from _recursive_iter(child)
-
-        return _recursive_iter(self.root)
+                    stack.append(iter(child._children))
+                    break
+            else:
+                stack.pop()
 
     def __contains__(self, play_class):
-        for node in self:
-            if node.play_class == play_class:
-                return True
-        return False
+        return play_class in self._by_class
 
+    # The lines are joined with newlines once at the end so there's no
+    # trailing newline to strip off
     def __str__(self):
-        def _cat_str(category, indent):
-            desc = ""
-            for child in category.children:
-                if isinstance(child, PlayRegistry.Node):
-                    desc += "    " * indent
-                    desc += str(child)
-                else:
-                    desc += "    " * indent + child.name + ':' + '\n'
-                    desc += _cat_str(child, indent + 1)
-                desc += '\n'
-            return desc[:-1]  # delete trailing newline
-
-        return "PlayRegistry:\n-------------\n" + _cat_str(self.root, 0)
+        lines = []
+        for child in self.root._children:
+            child._render(lines, "")
+        return "PlayRegistry:\n-------------\n" + "\n".join(lines)
 
     # module_path is a list like ['demo', 'my_demo']
     # returns a Node or None if it can't find it
@@ -149,24 +207,90 @@ class PlayRegistry(QtCore.QAbstractItemModel):
         category = self.root
         for module_name in module_path[:-1]:
             category = category[module_name]
-            if category is None:
+            if category is None or category._is_leaf:
                 return None
 
-        for child in category.children:
-            if isinstance(child, PlayRegistry.Node):
-                if child.module_name == module_path[-1]:
-                    return child
+        node = category[module_path[-1]]
+        if node is None or not node._is_leaf:
+            return None
+        return node
+
+    ## The children of a Category, in insertion order
+    # Children are kept both in a dict keyed by module name, for lookups, and in a list
+    # so the Qt model can index them by row.  Both are updated together, and
+    # each child's cached row is kept in sync with its position in the list.
+    class OrderedChildren():
+        __slots__ = ('_map', '_list')
+
+        def __init__(self):
+            self._map = dict()
+            self._list = list()
+
+        # adds @child at the end, or in place of an existing Node with the same
+        # module name (keeping its row).  Returns the replaced child or None.
+        # A Category and a Node can't share a module name, so mixing the two
+        # raises an AssertionError and leaves the children unchanged.
+        def add(self, child):
+            replaced = self._map.get(child.module_name)
+            if replaced is not None and not (replaced._is_leaf and
+                                             child._is_leaf):
+                raise AssertionError(
+                    "Can't add '" + child.module_name + "': a " +
+                    ("play" if replaced._is_leaf else "category") +
+                    " with that module name already exists")
+            if replaced is None:
+                child._row = len(self._list)
+                self._list.append(child)
+            else:
+                child._row = replaced._row
+                self._list[child._row] = child
+            self._map[child.module_name] = child
+            return replaced
 
-        return None
+        # removes and returns the child with the given module name
+        # raises a KeyError if there isn't one
+        def remove(self, name):
+            child = self._map.pop(name)
+            del self._list[child._row]
+
+            # renumber the children after it so their cached rows stay valid
+            for row in range(child._row, len(self._list)):
+                self._list[row]._row = row
+            return child
+
+        # returns the child with the given module name or None
+        def get(self, name):
+            return self._map.get(name)
+
+        def at(self, row):
+            return self._list[row]
+
+        def __contains__(self, name):
+            return name in self._map
+
+        def __len__(self):
+            return len(self._list)
+
+        def __iter__(self):
+            return iter(self._list)
 
     ## Categories correspond to filesystem directories
     class Category():
-        def __init__(self, parent, name):
-            super().__init__()
+        # there can be a lot of these and Qt touches them constantly, so skip
+        # the per-instance __dict__
+        __slots__ = ('_name', '_children', 'parent', '_row')
+
+        # lets traversals and the Qt callbacks tell Categories and Nodes apart
+        # without isinstance()
+        _is_leaf = False
 
+        def __init__(self, parent, name):
             self._name = name
-            self._children = list()
+            self._children = PlayRegistry.OrderedChildren()
             self.parent = parent
+            # index of this category within its parent, kept up to date by the
+            # parent so Qt's parent() calls don't have to search for it
+            self._row = 0
 
         @property
         def name(self):
@@ -182,61 +306,123 @@ class PlayRegistry(QtCore.QAbstractItemModel):
         def recalculate_scores(self, model):
             for child in self._children:
                 if child.recalculate_scores(model):
-                    row = child.parent.children.index(child)
+                    row = child.row
                     col = 1
                     parent = child.parent
                     index = model.createIndex(row, col, child)
                     model.dataChanged.emit(index, index)
             return False
 
+        # removes the child with the given module name, raising a KeyError if
+        # there isn't one.  The removed child is detached from this category.
+        def remove_child(self, name):
+            try:
+                child = self._children.remove(name)
+            except KeyError:
+                raise KeyError(
+                    "Attempt to delete a child node that doesn't exist")
+            child.parent = None
+
         def __delitem__(self, name):
-            for idx, child in enumerate(self.children):
-                if child.name == name:
-                    del self.children[idx]
-                    return
-            raise KeyError("Attempt to delete a child node that doesn't exist")
+            self.remove_child(name)
+
+        # appends the lines describing this category and its subtree to @lines,
+        # with each line prefixed by @indent_str
+        def _render(self, lines, indent_str):
+            lines.append(indent_str + self._name + ':')
+            child_indent_str = indent_str + "    "
+            for child in self._children:
+                child._render(lines, child_indent_str)
 
+        # adds @child to this category, replacing any existing Node with the
+        # same module name.  Returns the replaced child or None.
         def append_child(self, child):
-            self.children.append(child)
+            replaced = self._children.add(child)
             child.parent = self
+            if replaced is not None:
+                replaced.parent = None
+            return replaced
 
         def __getitem__(self, name):
-            for child in self.children:
-                if child.name == name:
-                    return child
-            return None
+            return self._children.get(name)
+
+        def __contains__(self, name):
+            return name in self._children
 
         def has_child_with_name(self, name):
-            return self[name] != None
+            return name in self._children
 
-        # @children is a list
+        # @children is a tuple of the child Categories and Nodes in insertion
+        # order.  It's a copy: use append_child() and remove_child() to modify
+        # the tree so the lookup map and cached rows stay in sync.
         @property
         def children(self):
-            return self._children
+            return tuple(self._children._list)
 
         @property
         def row(self):
-            if self.parent is not None:
-                return self.parent.children.index(self)
-            else:
-                return 0
+            return self._row
 
     class Node():
-        def __init__(self, module_name, play_class):
+        __slots__ = ('_module_name', '_last_score', '_registry', '_enabled',
+                     '_play_class', '_name', 'parent', '_row')
+
+        _is_leaf = True
+
+        # @registry is the PlayRegistry this node belongs to (or None).  Only a
+        # weak reference is kept so the node doesn't keep the model alive.
+        def __init__(self, module_name, play_class, registry=None):
             self._module_name = module_name
             self._last_score = float("inf")
-            self.enabled = False
-            self.play_class = play_class
+            self._registry = weakref.ref(
+                registry) if registry is not None else None
+            self._enabled = False
+            self._play_class = play_class
+            self._name = play_class.__name__
             self.parent = None
+            self._row = 0
 
         @property
         def name(self):
-            return self.play_class.__name__
+            return self._name
 
         @property
         def module_name(self):
             return self._module_name
 
+        # the play class can be swapped out when its module is reloaded, so we
+        # keep the registry's class index in sync here.  The class may have been
+        # renamed, but the parent Category keys its children by module name, so
+        # only the cached display name needs refreshing.
+        @property
+        def play_class(self):
+            return self._play_class
+
+        @play_class.setter
+        def play_class(self, value):
+            registry = self._registry() if self._registry is not None else None
+            if registry is not None and registry._by_class.get(
+                    self._play_class) is self:
+                del registry._by_class[self._play_class]
+                registry._by_class[value] = self
+            self._play_class = value
+            self._name = value.__name__
+
+        @property
+        def enabled(self):
+            return self._enabled
+
+        @enabled.setter
+        def enabled(self, value):
+            self._enabled = value
+            registry = self._registry() if self._registry is not None else None
+            if registry is not None:
+                if value:
+                    registry._enabled_nodes.add(self)
+                else:
+                    registry._enabled_nodes.discard(self)
+                registry._enabled_in_tree_order = None
+
         # recalculates and caches the score value for the play
         # returns True if the value changed and False otherwise
         def recalculate_scores(self, model):
@@ -248,10 +434,17 @@ class PlayRegistry(QtCore.QAbstractItemModel):
         def last_score(self):
             return self._last_score
 
+        @property
+        def row(self):
+            return self._row
+
         def __str__(self):
-            return self.play_class.__name__ + " " + (
+            return self._name + " " + (
                 "[ENABLED]" if self.enabled else "[DISABLED]")
 
+        def _render(self, lines, indent_str):
+            lines.append(indent_str + str(self))
+
     # Note: a lot of the QAbstractModel-specific implementation is borrowed from here:
     # http://www.hardcoded.net/articles/using_qtreeview_with_qabstractitemmodel.htm
 
@@ -261,63 +454,67 @@ class PlayRegistry(QtCore.QAbstractItemModel):
 
     def flags(self, index):
         if index.column() == 0:
-            return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsUserCheckable | QtCore.Qt.ItemIsEditable
+            return _PLAY_COLUMN_FLAGS
         else:
-            return QtCore.Qt.ItemIsEnabled
+            return _SCORE_COLUMN_FLAGS
+
+    # data() is called for every visible cell on every repaint, so it looks up
+    # a handler for the role in a dict rather than testing each role in turn.
+    # Each handler takes the item for the cell and its column.
+    @staticmethod
+    def _display_data(node, column):
+        if column == 0:
+            return node.name
+        elif column == 1 and node._is_leaf:
+            return str(node.play_class.score())
+        return None
+
+    @staticmethod
+    def _check_state_data(node, column):
+        if column == 0 and node._is_leaf:
+            return node.enabled
+        return None
+
+    _DATA_HANDLERS = {
+        _DISPLAY_ROLE: _display_data.__func__,
+        _CHECK_STATE_ROLE: _check_state_data.__func__,
+    }
 
     def data(self, index, role):
-        if not index.isValid():
+        handler = self._DATA_HANDLERS.get(role)
+        if handler is None or not index.isValid():
             return None
-        node = index.internalPointer()
-        if role == QtCore.Qt.DisplayRole:
-            if index.column() == 0:
-                return node.name
-            elif index.column() == 1:
-                if isinstance(node, PlayRegistry.Node):
-                    return str(node.play_class.score())
-                else:
-                    return None
-        elif role == QtCore.Qt.CheckStateRole and isinstance(
-                node, PlayRegistry.Node):
-            if index.column() == 0:
-                return node.enabled
-            else:
-                return None
-        return None
+        return handler(index.internalPointer(), index.column())
 
     def rowCount(self, parent):
         if not parent.isValid():
-            return len(self.root.children)
+            return len(self.root._children)
         node = parent.internalPointer()
-        if isinstance(node, PlayRegistry.Node):
+        if node._is_leaf:
             return 0
         else:
-            return len(node.children)
+            return len(node._children)
 
     def parent(self, index):
         if not index.isValid():
-            return QtCore.QModelIndex()
-        else:
-            node = index.internalPointer()
-            if node == None:
-                return QtCore.QModelIndex()
-            elif node.parent == None:
-                parentRow = 0
-            else:
-                parentRow = node.parent.row
-            return self.createIndex(parentRow, index.column(), node.parent)
+            return _INVALID_INDEX
+        node = index.internalPointer()
+        # top-level items (children of the hidden root category) have no parent
+        if node is None or node.parent is None or node.parent is self.root:
+            return _INVALID_INDEX
+        return self.createIndex(node.parent.row, index.column(), node.parent)
 
     def index(self, row, column, parent):
         if not parent.isValid():
-            return self.createIndex(row, column, self.root.children[row])
+            return self.createIndex(row, column, self.root._children.at(row))
         parentNode = parent.internalPointer()
-        if parentNode != None:
-            return self.createIndex(row, column, parentNode.children[row])
+        if parentNode is not None:
+            return self.createIndex(row, column, parentNode._children.at(row))
         else:
-            return QtCore.QModelIndex()
+            return _INVALID_INDEX
 
     def headerData(self, section, orientation, role):
-        if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
+        if orientation == _HORIZONTAL and role == _DISPLAY_ROLE:
             if section == 0:
                 return 'Play'
             else:
@@ -326,10 +523,10 @@ class PlayRegistry(QtCore.QAbstractItemModel):
 
     # this is implemented so we can enable/disable plays from the gui
     def setData(self, index, value, role):
-        if role == QtCore.Qt.CheckStateRole:
+        if role == _CHECK_STATE_ROLE:
             if index.isValid():
                 playNode = index.internalPointer()
-                if not isinstance(playNode, PlayRegistry.Node):
+                if not playNode._is_leaf:
                     raise AssertionError(
                         "Only Play Nodes should be checkable...")
                 playNode.enabled = not playNode.enabled
@@ -1,8 +1,27 @@
 import unittest
+from PyQt5 import QtCore
 import play_registry
 import plays.testing.line_up
 
 
+# extra play classes for tests that need more than one play in the registry
+class OtherPlay(plays.testing.line_up.LineUp):
+    pass
+
+
+class ThirdPlay(plays.testing.line_up.LineUp):
+    pass
+
+
+# stands in for a new version of LineUp after its module is reloaded
+class ReloadedLineUp(plays.testing.line_up.LineUp):
+    pass
+
+
+# a copy of the line_up module defines a different class with the same name
+CopiedLineUp = type('LineUp', (plays.testing.line_up.LineUp, ), {})
+
+
 class TestPlayRegistry(unittest.TestCase):
     def test_insert(self):
         pr = play_registry.PlayRegistry()
@@ -28,3 +47,233 @@ class TestPlayRegistry(unittest.TestCase):
         self.assertEqual(len(pr.root.children), 1)
         pr.delete(['demo', 'line_up'])
         self.assertEqual(len(pr.root.children), 0)
+
+    def test_rows_updated_after_delete(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        pr.insert(['demo', 'other_play'], OtherPlay)
+        demo = pr.root['demo']
+        self.assertEqual(demo['other_play'].row, 1)
+        pr.delete(['demo', 'line_up'])
+        self.assertEqual(demo['other_play'].row, 0)
+
+    def test_enabled_plays(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        self.assertEqual(pr.get_enabled_plays_paths(), [])
+        pr.node_for_module_path(['demo', 'line_up']).enabled = True
+        self.assertEqual(pr.get_enabled_plays_paths(), [['demo', 'line_up']])
+        pr.delete(['demo', 'line_up'])
+        self.assertEqual(pr.get_enabled_plays_and_scores(), [])
+
+    def test_contains_after_play_class_reload(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['line_up'], plays.testing.line_up.LineUp)
+        pr.node_for_module_path(['line_up']).play_class = ReloadedLineUp
+        self.assertFalse(plays.testing.line_up.LineUp in pr)
+        self.assertTrue(ReloadedLineUp in pr)
+
+    def test_iter_in_tree_order(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        pr.insert(['other_play'], OtherPlay)
+        pr.insert(['demo', 'nested', 'third_play'], ThirdPlay)
+        self.assertEqual([node.play_class for node in pr],
+                         [plays.testing.line_up.LineUp, ThirdPlay, OtherPlay])
+
+    def test_delete_prunes_nested_empty_categories(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'other_play'], OtherPlay)
+        pr.insert(['demo', 'nested', 'deeper', 'line_up'],
+                  plays.testing.line_up.LineUp)
+        pr.delete(['demo', 'nested', 'deeper', 'line_up'])
+        self.assertEqual(len(pr.root.children), 1)
+        self.assertEqual(pr.root['demo'].children,
+                         (pr.root['demo']['other_play'], ))
+
+    def test_str(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        pr.node_for_module_path(['demo', 'line_up']).enabled = True
+        self.assertEqual(
+            str(pr), "PlayRegistry:\n-------------\n"
+            "demo:\n"
+            "    LineUp [ENABLED]")
+
+    def test_str_nested(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'nested', 'line_up'], plays.testing.line_up.LineUp)
+        pr.insert(['demo', 'other_play'], OtherPlay)
+        self.assertEqual(
+            str(pr), "PlayRegistry:\n-------------\n"
+            "demo:\n"
+            "    nested:\n"
+            "        LineUp [DISABLED]\n"
+            "    OtherPlay [DISABLED]")
+
+    def test_remove_missing_child(self):
+        pr = play_registry.PlayRegistry()
+        with self.assertRaises(KeyError):
+            pr.root.remove_child('demo')
+
+    def test_modules_sharing_a_class_name(self):
+        """Copying a play file leaves two modules defining the same class name"""
+
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        pr.insert(['demo', 'line_up_copy'], CopiedLineUp)
+        self.assertEqual(len(pr.root['demo'].children), 2)
+        pr.delete(['demo', 'line_up'])
+        self.assertFalse(plays.testing.line_up.LineUp in pr)
+        self.assertTrue(CopiedLineUp in pr)
+        self.assertIsNone(pr.node_for_module_path(['demo', 'line_up']))
+        self.assertIs(
+            pr.node_for_module_path(['demo', 'line_up_copy']).play_class,
+            CopiedLineUp)
+
+    def test_enabled_plays_in_tree_order(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        pr.insert(['demo', 'other_play'], OtherPlay)
+        pr.insert(['third_play'], ThirdPlay)
+        pr.node_for_module_path(['third_play']).enabled = True
+        pr.node_for_module_path(['demo', 'line_up']).enabled = True
+        self.assertEqual(
+            [p[0] for p in pr.get_enabled_plays_and_scores()],
+            [plays.testing.line_up.LineUp, ThirdPlay])
+        pr.node_for_module_path(['demo', 'other_play']).enabled = True
+        self.assertEqual(pr.get_enabled_plays_paths(),
+                         [['demo', 'line_up'], ['demo', 'other_play'],
+                          ['third_play']])
+
+    def test_delete_after_play_class_renamed(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        node = pr.node_for_module_path(['demo', 'line_up'])
+        node.play_class = ReloadedLineUp
+        self.assertEqual(node.name, 'ReloadedLineUp')
+        pr.delete(['demo', 'line_up'])
+        self.assertFalse(ReloadedLineUp in pr)
+        self.assertEqual(len(pr.root.children), 0)
+
+    def test_insert_same_module_twice(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        pr.node_for_module_path(['demo', 'line_up']).enabled = True
+        pr.insert(['demo', 'line_up'], ReloadedLineUp)
+        self.assertEqual(len(pr.root['demo'].children), 1)
+        self.assertFalse(plays.testing.line_up.LineUp in pr)
+        self.assertEqual(pr.get_enabled_plays_and_scores(),
+                         [(ReloadedLineUp, float("inf"))])
+        pr.delete(['demo', 'line_up'])
+        self.assertEqual(len(pr.root.children), 0)
+        self.assertFalse(ReloadedLineUp in pr)
+        self.assertEqual(pr.get_enabled_plays_paths(), [])
+
+    def test_insert_under_a_play_module(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo'], plays.testing.line_up.LineUp)
+        with self.assertRaises(AssertionError):
+            pr.insert(['demo', 'other_play'], OtherPlay)
+        self.assertFalse(OtherPlay in pr)
+        self.assertIs(pr.node_for_module_path(['demo']).play_class,
+                      plays.testing.line_up.LineUp)
+
+    def test_delete_detaches_removed_items(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        node = pr.node_for_module_path(['demo', 'line_up'])
+        demo = node.parent
+        pr.delete(['demo', 'line_up'])
+        self.assertIsNone(node.parent)
+        self.assertIsNone(demo.parent)
+
+    def test_insert_play_over_a_category(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        with self.assertRaises(AssertionError):
+            pr.insert(['demo'], OtherPlay)
+        self.assertFalse(OtherPlay in pr)
+        self.assertEqual(len(pr.root.children), 1)
+        pr.delete(['demo', 'line_up'])
+        self.assertEqual(len(pr.root.children), 0)
+
+    def test_add_category_over_a_play(self):
+        pr = play_registry.PlayRegistry()
+        pr.insert(['demo'], plays.testing.line_up.LineUp)
+        with self.assertRaises(AssertionError):
+            pr.root.append_child(play_registry.PlayRegistry.Category(pr.root,
+                                                                     'demo'))
+        self.assertEqual(len(pr.root.children), 1)
+        self.assertIs(pr.node_for_module_path(['demo']).play_class,
+                      plays.testing.line_up.LineUp)
+
+
+class TestPlayRegistryModel(unittest.TestCase):
+    """Checks the QAbstractItemModel interface the play config tab uses"""
+
+    def setUp(self):
+        self.pr = play_registry.PlayRegistry()
+        self.pr.insert(['other_play'], OtherPlay)
+        self.pr.insert(['demo', 'line_up'], plays.testing.line_up.LineUp)
+        self.pr.insert(['demo', 'third_play'], ThirdPlay)
+        root = QtCore.QModelIndex()
+        self.other_play = self.pr.index(0, 0, root)
+        self.demo = self.pr.index(1, 0, root)
+        self.line_up = self.pr.index(0, 0, self.demo)
+        self.third_play = self.pr.index(1, 0, self.demo)
+
+    def test_index(self):
+        self.assertIs(self.other_play.internalPointer(),
+                      self.pr.node_for_module_path(['other_play']))
+        self.assertIs(self.demo.internalPointer(), self.pr.root['demo'])
+        self.assertIs(self.third_play.internalPointer(),
+                      self.pr.node_for_module_path(['demo', 'third_play']))
+
+    def test_parent(self):
+        self.assertFalse(self.pr.parent(self.other_play).isValid())
+        self.assertFalse(self.pr.parent(self.demo).isValid())
+
+        parent = self.pr.parent(self.third_play)
+        self.assertTrue(parent.isValid())
+        self.assertEqual(parent.row(), 1)
+        self.assertIs(parent.internalPointer(), self.pr.root['demo'])
+
+    def test_row_count(self):
+        self.assertEqual(self.pr.rowCount(QtCore.QModelIndex()), 2)
+        self.assertEqual(self.pr.rowCount(self.demo), 2)
+        self.assertEqual(self.pr.rowCount(self.line_up), 0)
+
+    def test_data(self):
+        display = QtCore.Qt.DisplayRole
+        check_state = QtCore.Qt.CheckStateRole
+        line_up_score = self.pr.index(0, 1, self.demo)
+        demo_score = self.pr.index(1, 1, QtCore.QModelIndex())
+
+        self.assertEqual(self.pr.data(self.line_up, display), 'LineUp')
+        self.assertEqual(self.pr.data(self.demo, display), 'demo')
+        self.assertEqual(
+            self.pr.data(line_up_score, display),
+            str(plays.testing.line_up.LineUp.score()))
+        self.assertIsNone(self.pr.data(demo_score, display))
+
+        self.assertEqual(self.pr.data(self.line_up, check_state), False)
+        self.assertIsNone(self.pr.data(line_up_score, check_state))
+        self.assertIsNone(self.pr.data(self.demo, check_state))
+
+        self.assertIsNone(self.pr.data(self.line_up, QtCore.Qt.ToolTipRole))
+        self.assertIsNone(self.pr.data(QtCore.QModelIndex(), display))
+
+    def test_set_data_toggles_enabled(self):
+        check_state = QtCore.Qt.CheckStateRole
+        self.assertTrue(self.pr.setData(self.line_up, True, check_state))
+        self.assertEqual(self.pr.data(self.line_up, check_state), True)
+        self.assertEqual(self.pr.get_enabled_plays_paths(),
+                         [['demo', 'line_up']])
+
+        self.assertTrue(self.pr.setData(self.line_up, False, check_state))
+        self.assertEqual(self.pr.get_enabled_plays_paths(), [])
+
+        self.assertFalse(self.pr.setData(self.line_up, True,
+                                         QtCore.Qt.DisplayRole))
+        self.assertEqual(self.pr.get_enabled_plays_paths(), [])